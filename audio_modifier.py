@@ -1,47 +1,472 @@
+#!/usr/bin/env python3
 """
 Audio Modifier - A tool for reading and modifying FLAC audio file metadata
+
+Single file:
+    python audio_modifier.py track.flac --cover cover.jpg --tag artist=Someone --tag title=Something
+
+Batch mode, driven by a manifest that maps files or glob patterns to tags and a cover:
+    python audio_modifier.py --manifest library.json --workers 8
+
+JSON manifest (a list of entries, "cover" and "tags" are optional):
+    [{"path": "Music/Album/*.flac", "cover": "Music/Album/cover.jpg", "tags": {"album": "Something"}}]
+
+CSV manifest (a "path" column, an optional "cover" column, every other column is a tag):
+    path,cover,artist,album
+    Music/Album/*.flac,Music/Album/cover.jpg,Someone,Something
+
+When several entries match the same file their tags are merged in manifest order.
+Covers are read once per batch and shared by every track that uses them; --max-cover-size
+downscales oversized art once (optional, needs: pip install Pillow).
+Files whose tags and cover already match are not saved at all, and files that have to be
+rewritten get extra metadata padding so the next edit can be done in place.
 """
 
-from mutagen import MutagenError
+import argparse
+import csv
+import glob
+import hashlib
+import io
+import json
+import os
+import struct
+import sys
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
+
 from mutagen.flac import FLAC, Picture
 
-FLAC_PATH = ""
-COVER_PATH = ""
+DEFAULT_WORKERS = min(32, (os.cpu_count() or 1) + 4)
+DEFAULT_COVER_CACHE_BYTES = 256 * 1024 * 1024
+# Room for a cover swap or a few extra tags without moving the audio data
+DEFAULT_PADDING = 256 * 1024
+
+
+def _unpack(fmt, data, offset):
+    """
+    struct.unpack_from that reports a short buffer as a corrupt image.
+    """
+    if offset + struct.calcsize(fmt) > len(data):
+        raise ValueError("truncated cover image header")
+    return struct.unpack_from(fmt, data, offset)
+
 
-try:
-    flac = FLAC(FLAC_PATH)
-    print(flac.pictures)
-    print(flac.pprint())
+def read_image_info(data):
+    """
+    Read (mime, width, height, depth, colors) from a JPEG, PNG or GIF header without decoding
+    the image. depth is bits per pixel; colors is the palette size of indexed images, else 0.
+    """
+    if data.startswith(b"\x89PNG\r\n\x1a\n") and data[12:16] == b"IHDR":
+        width, height, bit_depth, color_type = _unpack(">IIBB", data, 16)
+        if color_type != 3:
+            channels = {0: 1, 2: 3, 4: 2, 6: 4}.get(color_type, 1)
+            return "image/png", width, height, bit_depth * channels, 0
+        # Indexed: the palette size comes from the PLTE chunk, which precedes the image data
+        pos = 33
+        while pos + 8 <= len(data):
+            length, chunk_type = _unpack(">I4s", data, pos)
+            if chunk_type == b"PLTE":
+                return "image/png", width, height, bit_depth, length // 3
+            if chunk_type == b"IDAT":
+                break
+            pos += 12 + length
+        return "image/png", width, height, bit_depth, 1 << bit_depth
 
-    # Read the cover art image data
-    with open(COVER_PATH, "rb") as f:
-        cover_data = f.read()
+    if data[:6] in (b"GIF87a", b"GIF89a"):
+        width, height, packed = _unpack("<HHB", data, 6)
+        # GIF pixels are indexes into a palette of up to 2**bits colors
+        bits = (packed & 0x07) + 1
+        return "image/gif", width, height, bits, 1 << bits
+
+    if data.startswith(b"\xff\xd8"):
+        # Walk the JPEG segments until the first SOFn marker, which carries the frame size
+        pos = 2
+        while pos + 4 <= len(data):
+            if data[pos] != 0xFF:
+                break
+            marker = data[pos + 1]
+            if marker == 0xFF:
+                pos += 1
+                continue
+            if marker in (0x01, 0xD8) or 0xD0 <= marker <= 0xD7:
+                pos += 2
+                continue
+            (length,) = _unpack(">H", data, pos + 2)
+            if 0xC0 <= marker <= 0xCF and marker not in (0xC4, 0xC8, 0xCC):
+                precision, height, width, components = _unpack(">BHHB", data, pos + 4)
+                return "image/jpeg", width, height, precision * components, 0
+            pos += 2 + length
+
+    raise ValueError("unsupported or corrupt cover image (expected JPEG, PNG or GIF)")
+
+
+def resize_image(data, max_size):
+    """
+    Shrink an image so neither side exceeds max_size. Needs Pillow, which is only imported here.
+    """
+    try:
+        from PIL import Image
+    except ImportError as e:
+        raise RuntimeError("resizing covers requires Pillow: pip install Pillow") from e
+
+    with Image.open(io.BytesIO(data)) as image:
+        if max(image.size) <= max_size:
+            return data
+        image.thumbnail((max_size, max_size))
+        out = io.BytesIO()
+        if image.format == "PNG":
+            image.save(out, format="PNG", optimize=True)
+        else:
+            image.convert("RGB").save(out, format="JPEG", quality=90)
+        return out.getvalue()
+
+
+def build_picture(data):
+    """
+    Build a front cover Picture from image bytes, using the real size and MIME type of the image.
+    """
+    mime, width, height, depth, colors = read_image_info(data)
 
     # Create a Picture object
     picture = Picture()
-    picture.data = cover_data
-    picture.mime = "image/jpeg"
+    picture.data = data
+    picture.mime = mime
     picture.type = 3  # means front cover
-    picture.width = 500
-    picture.height = 500
-
-    # Clear existing pictures and add new picture
-    flac.clear_pictures()
-    flac.add_picture(picture)
-
-    metadata = {
-        "artist": "",
-        "description": "",
-        "genre": "",
-        "title": "",
-        "album": "",
-    }
-
-    for key, value in metadata.items():
-        flac[key] = value
-
-    flac.save()
-    print("Successfully updated metadata and added album art")
-except MutagenError as e:
-    print(e)
-    print(type(e))
+    picture.width = width
+    picture.height = height
+    picture.depth = depth
+    picture.colors = colors
+    return picture
+
+
+class CoverCache:
+    """
+    Thread-safe cache of built cover Pictures for one batch.
+
+    Each cover file is read once per (path, size, mtime); Pictures are keyed by the SHA-256 of the
+    file content, so identical art stored under different paths is packed only once. Threads asking
+    for a cover that is still being built wait for it instead of building it again. Pictures are
+    evicted least-recently-used once their image data exceeds max_bytes.
+    """
+
+    def __init__(self, max_bytes=DEFAULT_COVER_CACHE_BYTES, max_size=None):
+        self.max_bytes = max_bytes
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._digests = {}
+        self._in_flight = {}
+        self._pictures = OrderedDict()
+        self._bytes = 0
+
+    def get(self, cover_path):
+        """
+        Return the Picture for cover_path, reading and building it only on a cache miss.
+        """
+        st = os.stat(cover_path)
+        path_key = (os.path.abspath(cover_path), st.st_size, st.st_mtime_ns)
+        return self._once(path_key, lambda: self._digests.get(path_key), lambda: self._load(cover_path, path_key))
+
+    def _load(self, cover_path, path_key):
+        # Read the cover art image data outside the lock so other covers can load in parallel
+        with open(cover_path, "rb") as f:
+            cover_data = f.read()
+        digest = hashlib.sha256(cover_data).hexdigest()
+
+        with self._lock:
+            self._digests[path_key] = digest
+        return self._once(digest, lambda: digest, lambda: self._build(cover_data, digest))
+
+    def _build(self, cover_data, digest):
+        if self.max_size:
+            cover_data = resize_image(cover_data, self.max_size)
+        picture = build_picture(cover_data)
+
+        with self._lock:
+            self.misses += 1
+            self._pictures[digest] = picture
+            self._bytes += len(picture.data)
+            while self._bytes > self.max_bytes and len(self._pictures) > 1:
+                _, evicted = self._pictures.popitem(last=False)
+                self._bytes -= len(evicted.data)
+        return picture
+
+    def _once(self, key, cached_digest, build):
+        """
+        Return the cached Picture, or run build() once for key while concurrent callers wait on it.
+        """
+        with self._lock:
+            digest = cached_digest()
+            if digest in self._pictures:
+                self._pictures.move_to_end(digest)
+                self.hits += 1
+                return self._pictures[digest]
+            future = self._in_flight.get(key)
+            owner = future is None
+            if owner:
+                future = self._in_flight[key] = Future()
+
+        if not owner:
+            picture = future.result()
+            with self._lock:
+                self.hits += 1
+            return picture
+
+        try:
+            picture = build()
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(picture)
+            return picture
+        finally:
+            with self._lock:
+                del self._in_flight[key]
+
+
+def _tag_values(value):
+    """
+    Normalize a tag value the way mutagen stores Vorbis comments: a list of strings.
+    """
+    if isinstance(value, (list, tuple)):
+        return [str(v) for v in value]
+    return [str(value)]
+
+
+def _picture_key(picture):
+    """
+    Everything a FLAC picture block stores that a re-tag could change.
+    """
+    return (
+        picture.type,
+        picture.mime,
+        picture.width,
+        picture.height,
+        picture.depth,
+        picture.colors,
+        picture.data,
+    )
+
+
+def padding_policy(reserve):
+    """
+    Return a mutagen padding callback.
+
+    While the new metadata still fits, the existing padding is kept as-is so mutagen can
+    overwrite the metadata blocks in place. Only when it no longer fits (and the audio has to
+    be moved anyway) is a larger reserve written, so later edits fit without another rewrite.
+    """
+
+    def _padding(info):
+        if info.padding >= 0:
+            return info.padding
+        return reserve
+
+    return _padding
+
+
+def tag_file(flac_path, tags, cover_path=None, cover_cache=None, padding=DEFAULT_PADDING):
+    """
+    Write tags (and optionally a front cover) to a single FLAC file.
+    Returns False without touching the file when the tags and cover already match.
+    """
+    flac = FLAC(flac_path)
+    changed = False
+
+    if cover_path:
+        if cover_cache is None:
+            cover_cache = CoverCache()
+        picture = cover_cache.get(cover_path)
+        current = flac.pictures
+        if len(current) != 1 or _picture_key(current[0]) != _picture_key(picture):
+            # Clear existing pictures and add new picture
+            flac.clear_pictures()
+            flac.add_picture(picture)
+            changed = True
+
+    for key, value in tags.items():
+        value = _tag_values(value)
+        if flac.get(key) != value:
+            flac[key] = value
+            changed = True
+
+    if changed:
+        flac.save(padding=padding_policy(padding))
+    return changed
+
+
+def _add_job(jobs, pattern, tags, cover_path, base_dir):
+    """
+    Expand a path or glob pattern and merge its tags/cover into jobs.
+    """
+    pattern = os.path.join(base_dir, os.path.expanduser(pattern))
+    if cover_path:
+        cover_path = os.path.join(base_dir, os.path.expanduser(cover_path))
+
+    matches = sorted(glob.glob(pattern, recursive=True)) if glob.has_magic(pattern) else [pattern]
+    if not matches:
+        print(f"Warning: pattern matched no files: {pattern}", file=sys.stderr)
+
+    for path in matches:
+        job = jobs.setdefault(path, {"tags": {}, "cover": None})
+        job["tags"].update(tags)
+        if cover_path:
+            job["cover"] = cover_path
+
+
+def load_manifest(manifest_path):
+    """
+    Read a JSON or CSV manifest and return {flac_path: {"tags": {...}, "cover": path_or_None}}.
+    Relative paths in the manifest are resolved against the manifest's own directory.
+    """
+    base_dir = os.path.dirname(os.path.abspath(manifest_path))
+    jobs = {}
+
+    if manifest_path.lower().endswith(".csv"):
+        with open(manifest_path, "r", encoding="utf-8", newline="") as f:
+            for row in csv.DictReader(f):
+                pattern = row.pop("path", None)
+                if not pattern:
+                    continue
+                cover_path = row.pop("cover", None)
+                # Empty cells mean "leave this tag alone"
+                tags = {key: value for key, value in row.items() if key and value}
+                _add_job(jobs, pattern, tags, cover_path, base_dir)
+    else:
+        with open(manifest_path, "r", encoding="utf-8") as f:
+            entries = json.load(f)
+        for entry in entries:
+            _add_job(jobs, entry["path"], entry.get("tags", {}), entry.get("cover"), base_dir)
+
+    return jobs
+
+
+def run_batch(jobs, workers=DEFAULT_WORKERS, verbose=False, cover_cache=None, padding=DEFAULT_PADDING):
+    """
+    Tag every file in jobs using a thread pool. A failure on one file does not stop the others.
+    All workers share one CoverCache, so an album cover is read and packed once for all its tracks.
+    Returns (updated_count, unchanged_count, [(path, error), ...]).
+    """
+    updated = 0
+    unchanged = 0
+    failures = []
+    if cover_cache is None:
+        cover_cache = CoverCache()
+
+    # Tagging is dominated by file I/O, so threads keep the pool cheap and share one interpreter
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = {
+            executor.submit(tag_file, path, job["tags"], job["cover"], cover_cache, padding): path for path, job in jobs.items()
+        }
+        for future in as_completed(futures):
+            path = futures[future]
+            try:
+                changed = future.result()
+            except Exception as e:
+                failures.append((path, e))
+                print(f"Failed: {path}: {e}", file=sys.stderr)
+            else:
+                if changed:
+                    updated += 1
+                    if verbose:
+                        print(f"Tagged: {path}")
+                else:
+                    unchanged += 1
+                    if verbose:
+                        print(f"Unchanged: {path}")
+
+    return updated, unchanged, failures
+
+
+def parse_tag(value):
+    """
+    Parse a KEY=VALUE command line tag.
+    """
+    key, sep, tag_value = value.partition("=")
+    if not sep or not key:
+        raise argparse.ArgumentTypeError(f"tag must be KEY=VALUE, got '{value}'")
+    return key, tag_value
+
+
+def main():
+    """
+    Main function to parse arguments and run the tagger.
+    """
+    parser = argparse.ArgumentParser(description="Write tags and cover art to FLAC files.")
+    parser.add_argument("files", nargs="*", help="FLAC files or glob patterns to tag")
+    parser.add_argument("--manifest", help="JSON or CSV manifest mapping files/globs to tags and covers")
+    parser.add_argument("--cover", help="Front cover image (JPEG, PNG or GIF) applied to the given files")
+    parser.add_argument(
+        "--tag",
+        action="append",
+        type=parse_tag,
+        default=[],
+        metavar="KEY=VALUE",
+        help="Tag applied to the given files (repeatable)",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=DEFAULT_WORKERS,
+        help=f"Number of files processed in parallel (default: {DEFAULT_WORKERS})",
+    )
+    parser.add_argument(
+        "--max-cover-size",
+        type=int,
+        help="Downscale covers larger than this many pixels per side, once per batch (needs Pillow)",
+    )
+    parser.add_argument(
+        "--cover-cache-mb",
+        type=int,
+        default=DEFAULT_COVER_CACHE_BYTES // (1024 * 1024),
+        help="Memory cap for cached cover art in MB (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--padding-kb",
+        type=int,
+        default=DEFAULT_PADDING // 1024,
+        help="Metadata padding reserved when a file has to be rewritten, in KB (default: %(default)s)",
+    )
+    parser.add_argument("--verbose", action="store_true", help="Show detailed output")
+
+    args = parser.parse_args()
+
+    if not args.manifest and not args.files:
+        parser.error("give FLAC files or --manifest")
+    if args.workers < 1:
+        parser.error("--workers must be at least 1")
+
+    jobs = {}
+    if args.manifest:
+        try:
+            jobs = load_manifest(args.manifest)
+        except (OSError, ValueError, KeyError) as e:
+            print(f"Error reading manifest {args.manifest}: {e}", file=sys.stderr)
+            sys.exit(1)
+    for pattern in args.files:
+        _add_job(jobs, pattern, dict(args.tag), args.cover, os.getcwd())
+
+    cover_cache = CoverCache(args.cover_cache_mb * 1024 * 1024, args.max_cover_size)
+    start = time.perf_counter()
+    updated, unchanged, failures = run_batch(
+        jobs, args.workers, args.verbose, cover_cache, args.padding_kb * 1024
+    )
+    processed = updated + unchanged
+    elapsed = time.perf_counter() - start
+
+    print("---")
+    print(f"Files tagged: {updated}")
+    print(f"Already up to date: {unchanged}")
+    print(f"Failed: {len(failures)}")
+    print(f"Covers built: {cover_cache.misses}, reused: {cover_cache.hits}")
+    print(f"Elapsed: {elapsed:.2f}s ({processed / elapsed if elapsed else 0:.1f} files/sec)")
+    if failures:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
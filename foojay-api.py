@@ -1,61 +1,537 @@
+#!/usr/bin/env python3
+"""
+Resolve Temurin JDK download links through the foojay disco API.
+
+Resolves a whole version x OS x arch matrix in one concurrent round. Responses are kept
+in an on-disk cache: fresh entries (younger than --ttl) need no network call at all, stale
+ones are revalidated with If-None-Match / If-Modified-Since.
+
+Examples:
+    python foojay-api.py                                   # Java 17 for the current machine
+    python foojay-api.py -v 17 -v 21 --os linux --os macos --arch x64 --arch aarch64 --json
+
+    python foojay-api.py -v 21 --download --segments 4   # fetch, verify and store the archive
+
+--download looks up each package's SHA-256 through its pkg_info_uri, streams the archive to
+disk while hashing it, resumes interrupted downloads with Range requests and keeps archives in
+a content-addressed store so the same JDK is never downloaded twice.
+
+The API base URL can be pointed at a local stub with --base-url or FOOJAY_API_URL.
+"""
+
+import argparse
+import hashlib
+import itertools
 import json
+import os
 import platform
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
 import urllib.parse
 import urllib.request
+from concurrent.futures import ThreadPoolExecutor
 
+# Documentation: https://api.foojay.io/swagger-ui/
+BASE_URL = os.getenv("FOOJAY_API_URL", "https://api.foojay.io/disco/v3.0")
+CACHE_DIR = os.path.join(os.getenv("XDG_CACHE_HOME", os.path.expanduser("~/.cache")), "foojay")
+CACHE_TTL = 6 * 60 * 60
+REQUEST_TIMEOUT = 30
+STORE_DIR = os.path.join(os.getenv("XDG_DATA_HOME", os.path.expanduser("~/.local/share")), "foojay", "jdks")
+CHUNK_SIZE = 1024 * 1024
+PARALLEL_MIN_SIZE = 64 * 1024 * 1024
 
-def find_java_url(java_version):
-    # Detect current OS and Architecture
-    os_map = {"Darwin": "macos", "Linux": "linux", "Windows": "windows"}
-    arch_map = {
-        "arm64": "aarch64",
-        "aarch64": "aarch64",
-        "ARM64": "aarch64",
-        "AMD64": "x64",
-        "x86_64": "x64",
-    }
+OS_MAP = {"Darwin": "macos", "Linux": "linux", "Windows": "windows"}
+ARCH_MAP = {
+    "arm64": "aarch64",
+    "aarch64": "aarch64",
+    "ARM64": "aarch64",
+    "AMD64": "x64",
+    "x86_64": "x64",
+}
+
+
+def current_platform():
+    """
+    Detect current OS and Architecture in disco API terms.
+    """
+    return OS_MAP.get(platform.system(), "linux"), ARCH_MAP.get(platform.machine(), "x64")
 
-    current_os = os_map.get(platform.system(), "linux")
-    current_arch = arch_map.get(platform.machine(), "x64")
 
-    print(f"Checking for Java {java_version} on {current_os} {current_arch}")
+class ResponseCache:
+    """
+    On-disk cache of JSON API responses, one file per URL, with TTL and validator headers.
+    """
+
+    def __init__(self, cache_dir=CACHE_DIR, ttl=CACHE_TTL):
+        self.cache_dir = cache_dir
+        self.ttl = ttl
+
+    def _path(self, url):
+        return os.path.join(self.cache_dir, hashlib.sha256(url.encode()).hexdigest() + ".json")
+
+    def load(self, url):
+        """
+        Return the cached entry for url, or None.
+        """
+        try:
+            with open(self._path(url), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def is_fresh(self, entry):
+        return time.time() - entry.get("fetched_at", 0) < self.ttl
+
+    def store(self, url, body, etag=None, last_modified=None):
+        """
+        Write an entry atomically so concurrent jobs never see a half-written file.
+        """
+        entry = {
+            "url": url,
+            "fetched_at": time.time(),
+            "etag": etag,
+            "last_modified": last_modified,
+            "body": body,
+        }
+        os.makedirs(self.cache_dir, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(entry, f)
+            os.replace(tmp_path, self._path(url))
+        except OSError:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        return entry
+
+
+def fetch_json(url, cache=None):
+    """
+    GET a JSON document, going through cache when one is given.
+    Returns (body, source) where source is "cache", "revalidated" or "network".
+    """
+    entry = cache.load(url) if cache else None
+    if entry and cache.is_fresh(entry):
+        return entry["body"], "cache"
+
+    request = urllib.request.Request(url, headers={"Accept": "application/json"})
+    if entry:
+        if entry.get("etag"):
+            request.add_header("If-None-Match", entry["etag"])
+        if entry.get("last_modified"):
+            request.add_header("If-Modified-Since", entry["last_modified"])
+
+    try:
+        with urllib.request.urlopen(request, timeout=REQUEST_TIMEOUT) as response:
+            body = json.loads(response.read().decode())
+            if cache:
+                cache.store(url, body, response.headers.get("ETag"), response.headers.get("Last-Modified"))
+            return body, "network"
+    except urllib.error.HTTPError as e:
+        if e.code == 304 and entry:
+            cache.store(url, entry["body"], entry.get("etag"), entry.get("last_modified"))
+            return entry["body"], "revalidated"
+        raise
 
-    # Build the API Query
-    # Documentation: https://api.foojay.io/swagger-ui/
-    base_url = "https://api.foojay.io/disco/v3.0/packages"
+
+def packages_url(java_version, operating_system, architecture, base_url=BASE_URL):
+    """
+    Build the packages query URL for one target.
+    """
     params = {
         "version": java_version,
-        "operating_system": current_os,
-        "architecture": current_arch,
+        "operating_system": operating_system,
+        "architecture": architecture,
         "latest": "available",
         "distribution": "temurin",
         "package_type": "jdk",
     }
+    return f"{base_url}/packages?{urllib.parse.urlencode(params)}"
 
-    query_string = urllib.parse.urlencode(params)
-    url = f"{base_url}?{query_string}"
 
-    # Request the data
+def resolve_target(target, cache=None, base_url=BASE_URL):
+    """
+    Resolve one (java_version, operating_system, architecture) target into a result dict.
+    Errors are recorded in the result instead of raised, so one bad target does not sink a matrix.
+    """
+    java_version, operating_system, architecture = target
+    result = {
+        "version": str(java_version),
+        "operating_system": operating_system,
+        "architecture": architecture,
+        "packages": [],
+        "source": None,
+        "error": None,
+    }
     try:
-        with urllib.request.urlopen(url) as response:
-            data = json.loads(response.read().decode())
+        data, result["source"] = fetch_json(packages_url(java_version, operating_system, architecture, base_url), cache)
+    except Exception as e:
+        result["error"] = f"Error querying API: {e}"
+        return result
+
+    for pkg in data.get("result") or []:
+        links = pkg.get("links", {})
+        result["packages"].append(
+            {
+                "distribution": pkg.get("distribution"),
+                "java_version": pkg.get("java_version"),
+                "filename": pkg.get("filename"),
+                "archive_type": pkg.get("archive_type"),
+                "size": pkg.get("size"),
+                "download_url": links.get("pkg_download_redirect"),
+                # sha info needs further retrieval from pkg_info_uri, see fetch_package_info
+                "pkg_info_uri": links.get("pkg_info_uri"),
+            }
+        )
+    return result
+
+
+def resolve_matrix(versions, operating_systems, architectures, cache=None, base_url=BASE_URL, workers=8):
+    """
+    Resolve every version x OS x arch combination concurrently. Results keep the matrix order.
+    """
+    targets = list(itertools.product(versions, operating_systems, architectures))
+    if not targets:
+        return []
+    with ThreadPoolExecutor(max_workers=min(workers, len(targets))) as executor:
+        return list(executor.map(lambda target: resolve_target(target, cache, base_url), targets))
+
+
+class _OrderedHasher:
+    """
+    SHA-256 over chunks that arrive out of order from parallel range downloads.
+
+    Chunks at the current position are hashed immediately; later ones wait in memory until the
+    gap before them is filled. Workers ahead of the cursor block once max_pending bytes are
+    buffered, which cannot deadlock because the worker owning the cursor never has to wait.
+    """
+
+    def __init__(self, max_pending=64 * CHUNK_SIZE):
+        self.max_pending = max_pending
+        self.position = 0
+        self._hash = hashlib.sha256()
+        self._pending = {}
+        self._pending_bytes = 0
+        self._aborted = False
+        self._cond = threading.Condition()
 
-            if not data.get("result"):
-                print("No matching Java version found.")
+    def feed(self, offset, chunk):
+        with self._cond:
+            while offset != self.position and self._pending_bytes + len(chunk) > self.max_pending:
+                if self._aborted:
+                    raise OSError("download aborted")
+                self._cond.wait()
+            if offset != self.position:
+                self._pending[offset] = chunk
+                self._pending_bytes += len(chunk)
                 return
+            self._hash.update(chunk)
+            self.position += len(chunk)
+            while self.position in self._pending:
+                chunk = self._pending.pop(self.position)
+                self._pending_bytes -= len(chunk)
+                self._hash.update(chunk)
+                self.position += len(chunk)
+            self._cond.notify_all()
 
-            for pkg in data["result"]:
-                print("\n--- FOUND JDK ---")
-                print(f"Vendor:   {pkg.get('distribution')}")
-                print(f"Version:  {pkg.get('java_version')}")
-                print(f"File:     {pkg.get('filename')}")
-                # sha info needs further retrieval from pkg_info_uri
-                # print(f"SHA256:   {pkg.get('checksum')}")
-                print(f"Download: {pkg.get('links', {}).get('pkg_download_redirect')}")
-                print("-----------------")
-    except Exception as e:
-        print(f"Error querying API: {e}")
+    def abort(self):
+        with self._cond:
+            self._aborted = True
+            self._cond.notify_all()
+
+    def hexdigest(self):
+        return self._hash.hexdigest()
+
+
+def fetch_package_info(pkg, cache=None):
+    """
+    Look up the direct download URL, size and SHA-256 of a package through its pkg_info_uri.
+    """
+    data, _ = fetch_json(pkg["pkg_info_uri"], cache)
+    info = (data.get("result") or [{}])[0]
+    checksum = info.get("checksum") if (info.get("checksum_type") or "").lower() == "sha256" else None
+    return {
+        "filename": info.get("filename") or pkg["filename"],
+        "url": info.get("direct_download_uri") or pkg["download_url"],
+        "size": info.get("size") or pkg.get("size"),
+        "sha256": checksum.lower() if checksum else None,
+    }
+
+
+def _open_range(url, start=0, end=None):
+    """
+    Open url, asking for bytes start..end (inclusive) when a range is given.
+    """
+    request = urllib.request.Request(url)
+    if start or end is not None:
+        request.add_header("Range", f"bytes={start}-{'' if end is None else end}")
+    return urllib.request.urlopen(request, timeout=REQUEST_TIMEOUT)
+
+
+def _write_response(response, f, offset, on_chunk):
+    """
+    Copy a response body into f at offset, calling on_chunk(offset, chunk) for every chunk.
+    """
+    f.seek(offset)
+    for chunk in iter(lambda: response.read(CHUNK_SIZE), b""):
+        f.write(chunk)
+        on_chunk(offset, chunk)
+        offset += len(chunk)
+    return offset
+
+
+def _download_stream(url, part_path):
+    """
+    Stream url into part_path, resuming an existing partial file with a Range request.
+    Returns the SHA-256 of the complete file, computed while downloading.
+    """
+    hasher = hashlib.sha256()
+    offset = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+    if offset:
+        # Only the bytes already on disk are read back; the rest is hashed as it arrives
+        with open(part_path, "rb") as f:
+            for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+                hasher.update(chunk)
+
+    try:
+        response = _open_range(url, offset)
+    except urllib.error.HTTPError as e:
+        if e.code == 416 and offset:
+            # Nothing left to fetch, the partial file is already complete
+            return hasher.hexdigest()
+        raise
+
+    with response:
+        if offset and response.status != 206:
+            # Server ignored the Range header, start over
+            offset = 0
+            hasher = hashlib.sha256()
+        with open(part_path, "r+b" if offset else "wb") as f:
+            f.truncate(offset)
+            _write_response(response, f, offset, lambda _, chunk: hasher.update(chunk))
+    return hasher.hexdigest()
+
+
+def _download_ranges(url, ranges_path, size, segments):
+    """
+    Download url as `segments` parallel byte ranges written in place into ranges_path.
+    Falls back to a single stream when the server does not honour Range requests.
+
+    ranges_path is pre-sized and filled out of order, so until this returns its length says
+    nothing about how much was downloaded. It must never be resumed by offset.
+    """
+    bounds = [(i * size // segments, (i + 1) * size // segments - 1) for i in range(segments)]
+    hasher = _OrderedHasher()
+
+    # The first range request doubles as the probe for Range support
+    first = _open_range(url, *bounds[0])
+    if first.status != 206:
+        with first, open(ranges_path, "wb") as f:
+            plain = hashlib.sha256()
+            _write_response(first, f, 0, lambda _, chunk: plain.update(chunk))
+        return plain.hexdigest()
+
+    with open(ranges_path, "wb") as f:
+        f.truncate(size)
+
+    def fetch(index):
+        start, end = bounds[index]
+        try:
+            with first if index == 0 else _open_range(url, start, end) as response, open(ranges_path, "r+b") as f:
+                if response.status != 206:
+                    raise OSError(f"server ignored Range request for bytes {start}-{end}")
+                if _write_response(response, f, start, hasher.feed) != end + 1:
+                    raise OSError(f"short read for bytes {start}-{end}")
+        except BaseException:
+            hasher.abort()
+            raise
+
+    try:
+        # One thread per range: the hasher relies on every range making progress
+        with ThreadPoolExecutor(max_workers=segments) as executor:
+            for future in [executor.submit(fetch, index) for index in range(segments)]:
+                future.result()
+    except BaseException:
+        # A sparse partial file cannot be resumed by offset, so drop it
+        os.remove(ranges_path)
+        raise
+    return hasher.hexdigest()
+
+
+def _find_in_store(store_dir, digest):
+    """
+    Return the stored file with this SHA-256, or None.
+    """
+    digest_dir = os.path.join(store_dir, "sha256", digest)
+    if os.path.isdir(digest_dir):
+        for name in sorted(os.listdir(digest_dir)):
+            return os.path.join(digest_dir, name)
+    return None
+
+
+def download_package(pkg, store_dir=STORE_DIR, cache=None, segments=1):
+    """
+    Download a resolved package into the content-addressed store (store_dir/sha256/<digest>/<filename>).
+
+    The archive is hashed while it streams to disk and checked against the published SHA-256.
+    Interrupted single-stream downloads resume from store_dir/partial/<name>.part; parallel
+    downloads use <name>.ranges, which is discarded rather than resumed. Archives already in the
+    store are not downloaded again. When no SHA-256 is published the archive is stored under its
+    computed hash but reported as unverified.
+    Returns (path, sha256, source, verified) where source is "store" or "network".
+    """
+    info = fetch_package_info(pkg, cache)
+    if info["sha256"]:
+        path = _find_in_store(store_dir, info["sha256"])
+        if path:
+            return path, info["sha256"], "store", True
+
+    partial_dir = os.path.join(store_dir, "partial")
+    os.makedirs(partial_dir, exist_ok=True)
+    part_name = info["sha256"] or hashlib.sha256(info["url"].encode()).hexdigest()
+    part_path = os.path.join(partial_dir, part_name + ".part")
+    ranges_path = os.path.join(partial_dir, part_name + ".ranges")
+    if os.path.exists(ranges_path):
+        # Left behind by a parallel download that was killed, its holes cannot be resumed
+        os.remove(ranges_path)
+
+    size = info["size"]
+    if segments > 1 and size and size >= PARALLEL_MIN_SIZE and not os.path.exists(part_path):
+        digest = _download_ranges(info["url"], ranges_path, size, segments)
+        os.replace(ranges_path, part_path)
+    else:
+        digest = _download_stream(info["url"], part_path)
+
+    if info["sha256"] and digest != info["sha256"]:
+        os.remove(part_path)
+        raise ValueError(f"checksum mismatch for {info['filename']}: expected {info['sha256']}, got {digest}")
+
+    path = _find_in_store(store_dir, digest)
+    if path:
+        os.remove(part_path)
+    else:
+        path = os.path.join(store_dir, "sha256", digest, os.path.basename(info["filename"]))
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        os.replace(part_path, path)
+    return path, digest, "network", bool(info["sha256"])
+
+
+def download_results(results, store_dir=STORE_DIR, cache=None, segments=1):
+    """
+    Download every package in resolved results, recording path/sha256 or error on each package.
+    """
+    for result in results:
+        for pkg in result["packages"]:
+            try:
+                pkg["path"], pkg["sha256"], pkg["download_source"], pkg["verified"] = download_package(
+                    pkg, store_dir, cache, segments
+                )
+            except Exception as e:
+                pkg["error"] = f"Error downloading {pkg['filename']}: {e}"
+                continue
+            if not pkg["verified"]:
+                print(f"Warning: no published SHA-256 for {pkg['filename']}, download not verified", file=sys.stderr)
+
+
+def print_result(result):
+    """
+    Print one target result in the human readable format.
+    """
+    print(f"Checking for Java {result['version']} on {result['operating_system']} {result['architecture']}")
+    if result["error"]:
+        print(result["error"])
+        return
+    if not result["packages"]:
+        print("No matching Java version found.")
+        return
+
+    for pkg in result["packages"]:
+        print("\n--- FOUND JDK ---")
+        print(f"Vendor:   {pkg['distribution']}")
+        print(f"Version:  {pkg['java_version']}")
+        print(f"File:     {pkg['filename']}")
+        print(f"Download: {pkg['download_url']}")
+        if pkg.get("sha256"):
+            note = "" if pkg.get("verified") else " (computed locally, NOT verified)"
+            print(f"SHA256:   {pkg['sha256']}{note}")
+        if pkg.get("path"):
+            print(f"Path:     {pkg['path']} ({pkg['download_source']})")
+        if pkg.get("error"):
+            print(pkg["error"])
+        print("-----------------")
+
+
+def find_java_url(java_version):
+    """
+    Print the download links for java_version on the current machine.
+    """
+    current_os, current_arch = current_platform()
+    print_result(resolve_target((java_version, current_os, current_arch), ResponseCache()))
+
+
+def main():
+    """
+    Main function to parse arguments and resolve the requested matrix.
+    """
+    current_os, current_arch = current_platform()
+    parser = argparse.ArgumentParser(description="Resolve Temurin JDK downloads for a version x OS x arch matrix.")
+    parser.add_argument(
+        "-v", "--version", action="append", dest="versions", help="Java version (repeatable, default: 17)"
+    )
+    parser.add_argument(
+        "--os", action="append", dest="operating_systems", help=f"Operating system (repeatable, default: {current_os})"
+    )
+    parser.add_argument(
+        "--arch", action="append", dest="architectures", help=f"Architecture (repeatable, default: {current_arch})"
+    )
+    parser.add_argument("--base-url", default=BASE_URL, help="disco API base URL (default: %(default)s)")
+    parser.add_argument("--cache-dir", default=CACHE_DIR, help="Response cache directory (default: %(default)s)")
+    parser.add_argument("--ttl", type=int, default=CACHE_TTL, help="Seconds before a cached response is revalidated")
+    parser.add_argument("--no-cache", action="store_true", help="Always query the API and do not write the cache")
+    parser.add_argument("--workers", type=int, default=8, help="Concurrent API requests (default: %(default)s)")
+    parser.add_argument("--download", action="store_true", help="Download and verify the resolved packages")
+    parser.add_argument("--store-dir", default=STORE_DIR, help="JDK download store (default: %(default)s)")
+    parser.add_argument(
+        "--segments",
+        type=int,
+        default=1,
+        help="Parallel Range requests per archive of at least 64 MB (default: %(default)s)",
+    )
+    parser.add_argument("--json", action="store_true", help="Print results as JSON")
+
+    args = parser.parse_args()
+
+    if args.workers < 1:
+        parser.error("--workers must be at least 1")
+
+    cache = None if args.no_cache else ResponseCache(args.cache_dir, args.ttl)
+    results = resolve_matrix(
+        args.versions or ["17"],
+        args.operating_systems or [current_os],
+        args.architectures or [current_arch],
+        cache,
+        args.base_url,
+        args.workers,
+    )
+
+    if args.download:
+        download_results(results, args.store_dir, cache, args.segments)
+
+    if args.json:
+        json.dump(results, sys.stdout, indent=2)
+        print()
+    else:
+        for result in results:
+            print_result(result)
+            print()
+
+    if any(result["error"] or any(pkg.get("error") for pkg in result["packages"]) for result in results):
+        sys.exit(1)
 
 
 if __name__ == "__main__":
-    find_java_url(17)
+    main()
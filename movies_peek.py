@@ -8,33 +8,20 @@ Setup:
 Run (token via env so it isn't hard-coded):
     export VAULT_TOKEN='hvs....'   # root token for now; scoped token later
     python movies_peek.py
-"""
 
-import os
+The URI is cached locally by vault_secrets, so VAULT_TOKEN is only needed when the
+cache is empty or older than VAULT_CACHE_TTL seconds.
+"""
 
-import hvac
-from pymongo import MongoClient
+from vault_secrets import MONGO_KEY, connect_mongo
 
 # config
-VAULT_ADDR = os.getenv("VAULT_ADDR", "https://vault.sundalei.tech")
-VAULT_TOKEN = os.environ["VAULT_TOKEN"]
-KV_MOUNT = "secret"
-SECRET_PATH = "mongo-es-demo"
-MONGO_KEY = "spring.mongodb.uri"
 COLLECTION = "movies"
 
-# read the Mongo URI from vault
-vault = hvac.Client(url=VAULT_ADDR, token=VAULT_TOKEN)
-assert vault.is_authenticated(), "Vault auth failed - check VAULT_TOKEN"
-
-secret = vault.secrets.kv.v2.read_secret_version(path=SECRET_PATH, mount_point=KV_MOUNT)
-mongo_uri = secret["data"]["data"][MONGO_KEY]
+# read the Mongo URI from the local cache or vault, and connect to Mongo
+client, mongo_uri = connect_mongo()
 print(mongo_uri)
-print(f"Got {MONGO_KEY} from Vault (len={len(mongo_uri)})")
-
-# connect to Mongo
-client = MongoClient(mongo_uri, serverSelectionTimeoutMS=50000)
-client.admin.command("ping")
+print(f"Got {MONGO_KEY} (len={len(mongo_uri)})")
 print("Connected to MongoDB")
 
 try:
@@ -0,0 +1,438 @@
+#!/usr/bin/env python3
+"""
+Profile field types, null rates and cardinality across the whole movies collection.
+
+The collection is split into _id ranges using split points picked from a $sample of _ids.
+The ranges are scanned in parallel worker processes, each with its own MongoClient, an
+optional projection and large batches. Every worker builds a mergeable schema sketch:
+type counts, null counts and a k-minimum-values distinct estimate per field. The sketches
+are merged into one report, which can also seed an Elasticsearch mapping.
+
+Run against the Vault-configured cluster (see movies_peek.py / vault_secrets.py):
+    python movies_profile.py --partitions 8
+
+Run against a local mongod, writing the report and a mapping:
+    python movies_profile.py --uri mongodb://localhost:27017 --db sample_mflix \\
+        --json movies_schema.json --es-mapping movies_mapping.json
+"""
+
+import argparse
+import datetime
+import hashlib
+import heapq
+import json
+import multiprocessing
+import os
+import sys
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+
+from bson import Decimal128, ObjectId
+from pymongo import MongoClient
+from vault_secrets import connect_mongo
+
+COLLECTION = "movies"
+DEFAULT_PARTITIONS = os.cpu_count() or 4
+SAMPLES_PER_PARTITION = 20
+BATCH_SIZE = 5000
+KMV_SIZE = 1024
+# Strings at least this long on average are mapped as full-text fields
+TEXT_MIN_LENGTH = 32
+
+# $type aliases for the _id types that can be range-partitioned
+ID_TYPE_ALIASES = {
+    ObjectId: "objectId",
+    str: "string",
+    int: "number",
+    float: "number",
+    datetime.datetime: "date",
+}
+
+ES_TYPES = {
+    "int": "integer",
+    "long": "long",
+    "double": "double",
+    "decimal": "double",
+    "bool": "boolean",
+    "date": "date",
+    "objectId": "keyword",
+    "binData": "binary",
+}
+
+
+def _type_name(value):
+    """
+    Name a decoded BSON value the way the report and mapping refer to it.
+    """
+    if value is None:
+        return "null"
+    if isinstance(value, bool):
+        return "bool"
+    if isinstance(value, int):
+        return "int" if -(2**31) <= value < 2**31 else "long"
+    if isinstance(value, float):
+        return "double"
+    if isinstance(value, str):
+        return "string"
+    if isinstance(value, dict):
+        return "object"
+    if isinstance(value, list):
+        return "array"
+    if isinstance(value, datetime.datetime):
+        return "date"
+    if isinstance(value, ObjectId):
+        return "objectId"
+    if isinstance(value, Decimal128):
+        return "decimal"
+    if isinstance(value, bytes):
+        return "binData"
+    return type(value).__name__
+
+
+class DistinctSketch:
+    """
+    K-minimum-values distinct counter. Exact below k values, mergeable across partitions.
+    """
+
+    def __init__(self, k=KMV_SIZE):
+        self.k = k
+        self._heap = []  # negated hashes, so the largest kept hash is on top
+        self._hashes = set()
+
+    def add(self, value):
+        digest = hashlib.blake2b(f"{type(value).__name__}:{value!r}".encode(), digest_size=8).digest()
+        self._add_hash(int.from_bytes(digest, "big"))
+
+    def _add_hash(self, h):
+        if h in self._hashes:
+            return
+        if len(self._heap) < self.k:
+            heapq.heappush(self._heap, -h)
+            self._hashes.add(h)
+        elif h < -self._heap[0]:
+            self._hashes.discard(-heapq.heapreplace(self._heap, -h))
+            self._hashes.add(h)
+
+    def merge(self, other):
+        for h in other._hashes:
+            self._add_hash(h)
+
+    def estimate(self):
+        if len(self._heap) < self.k:
+            return len(self._heap)
+        return round((self.k - 1) * 2**64 / (-self._heap[0] + 1))
+
+
+class FieldStats:
+    """
+    Per-field counters: values seen, nulls, types, distinct values and string length.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.nulls = 0
+        self.types = Counter()
+        self.distinct = DistinctSketch()
+        self.string_count = 0
+        self.string_length = 0
+
+    def add(self, value):
+        type_name = _type_name(value)
+        self.count += 1
+        self.types[type_name] += 1
+        if value is None:
+            self.nulls += 1
+        elif type_name not in ("object", "array"):
+            self.distinct.add(value)
+            if type_name == "string":
+                self.string_count += 1
+                self.string_length += len(value)
+
+    def merge(self, other):
+        self.count += other.count
+        self.nulls += other.nulls
+        self.types.update(other.types)
+        self.distinct.merge(other.distinct)
+        self.string_count += other.string_count
+        self.string_length += other.string_length
+
+
+class SchemaSketch:
+    """
+    Field statistics for a set of documents. Nested fields use dotted paths and array
+    elements a "[]" suffix, e.g. "imdb.rating" and "cast[]".
+    """
+
+    def __init__(self):
+        self.documents = 0
+        self.fields = {}
+
+    def add_document(self, doc):
+        self.documents += 1
+        self._add_object(doc, "")
+
+    def _add_object(self, doc, prefix):
+        for key, value in doc.items():
+            self._add_value(prefix + key, value)
+
+    def _add_value(self, path, value):
+        stats = self.fields.get(path)
+        if stats is None:
+            stats = self.fields[path] = FieldStats()
+        stats.add(value)
+        if isinstance(value, dict):
+            self._add_object(value, path + ".")
+        elif isinstance(value, list):
+            for item in value:
+                self._add_value(path + "[]", item)
+
+    def merge(self, other):
+        self.documents += other.documents
+        for path, stats in other.fields.items():
+            if path in self.fields:
+                self.fields[path].merge(stats)
+            else:
+                self.fields[path] = stats
+
+
+def split_points(collection, partitions, samples_per_partition=SAMPLES_PER_PARTITION):
+    """
+    Pick partitions - 1 _id split points from a sorted $sample of _ids.
+    Returns (points, id_type_alias); no points when the sampled _ids cannot be range-split.
+    """
+    if partitions <= 1:
+        return [], None
+
+    pipeline = [
+        {"$sample": {"size": partitions * samples_per_partition}},
+        {"$project": {"_id": 1}},
+        {"$sort": {"_id": 1}},
+    ]
+    ids = [doc["_id"] for doc in collection.aggregate(pipeline)]
+    aliases = {ID_TYPE_ALIASES.get(type(_id)) for _id in ids}
+    # Range queries only match values of the bound's own type bracket
+    if len(aliases) != 1 or None in aliases:
+        return [], None
+
+    points = []
+    for i in range(1, partitions):
+        point = ids[len(ids) * i // partitions]
+        if not points or point != points[-1]:
+            points.append(point)
+    return points, aliases.pop()
+
+
+def partition_queries(points, id_type):
+    """
+    Turn split points into non-overlapping _id range queries that together cover the collection.
+    """
+    if not points:
+        return [{}]
+
+    bounds = [None, *points, None]
+    queries = []
+    for low, high in zip(bounds, bounds[1:]):
+        condition = {"$type": id_type}
+        if low is not None:
+            condition["$gte"] = low
+        if high is not None:
+            condition["$lt"] = high
+        queries.append({"_id": condition})
+    # Documents whose _id is of another type fall outside every range
+    queries.append({"_id": {"$not": {"$type": id_type}}})
+    return queries
+
+
+def scan_partition(uri, db_name, collection_name, query, projection=None, batch_size=BATCH_SIZE):
+    """
+    Scan one partition in a worker process and return its SchemaSketch.
+    """
+    client = MongoClient(uri)
+    try:
+        cursor = client[db_name][collection_name].find(query, projection, batch_size=batch_size)
+        if query:
+            cursor = cursor.hint([("_id", 1)])
+        sketch = SchemaSketch()
+        for doc in cursor:
+            sketch.add_document(doc)
+        return sketch
+    finally:
+        client.close()
+
+
+def profile_collection(uri, db_name, collection_name, partitions, fields=None, batch_size=BATCH_SIZE):
+    """
+    Partition the collection, scan the partitions in parallel and return the merged SchemaSketch.
+    """
+    client = MongoClient(uri)
+    try:
+        points, id_type = split_points(client[db_name][collection_name], partitions)
+    finally:
+        client.close()
+
+    queries = partition_queries(points, id_type)
+    projection = dict.fromkeys(fields, 1) if fields else None
+
+    merged = SchemaSketch()
+    # spawn: MongoClient is not fork-safe, every worker opens its own
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=min(len(queries), partitions), mp_context=context) as executor:
+        futures = [
+            executor.submit(scan_partition, uri, db_name, collection_name, query, projection, batch_size)
+            for query in queries
+        ]
+        for future in futures:
+            merged.merge(future.result())
+    return merged
+
+
+def build_report(sketch):
+    """
+    Turn a SchemaSketch into a JSON-serializable report.
+    """
+    fields = {}
+    for path, stats in sorted(sketch.fields.items()):
+        field = {
+            "count": stats.count,
+            "null_rate": round(stats.nulls / stats.count, 4) if stats.count else 0.0,
+            "types": dict(stats.types.most_common()),
+            "distinct_estimate": stats.distinct.estimate(),
+        }
+        if "[]" not in path:
+            field["present_rate"] = round(stats.count / sketch.documents, 4) if sketch.documents else 0.0
+        if stats.string_count:
+            field["avg_length"] = round(stats.string_length / stats.string_count, 1)
+        fields[path] = field
+    return {"documents": sketch.documents, "fields": fields}
+
+
+def _es_field_type(types, avg_length):
+    """
+    Pick an Elasticsearch field definition for the non-null types seen at one path.
+    """
+    if types == {"string"}:
+        if avg_length >= TEXT_MIN_LENGTH:
+            return {"type": "text", "fields": {"keyword": {"type": "keyword", "ignore_above": 256}}}
+        return {"type": "keyword"}
+    if types and types <= {"int", "long", "double", "decimal"}:
+        if types & {"double", "decimal"}:
+            return {"type": "double"}
+        return {"type": "long" if "long" in types else "integer"}
+    if len(types) == 1:
+        return {"type": ES_TYPES.get(next(iter(types)), "keyword")}
+    # Mixed scalar types: keyword accepts all of them
+    return {"type": "keyword"}
+
+
+def es_mapping(report):
+    """
+    Seed an Elasticsearch mapping from a schema report. Arrays map to their element type.
+    """
+    merged = {}
+    for path, field in report["fields"].items():
+        # ES has no array type: "cast[]" and "cast" describe the same field
+        es_path = path.replace("[]", "")
+        if es_path == "_id":
+            continue
+        entry = merged.setdefault(es_path, {"types": set(), "avg_length": 0.0})
+        entry["types"].update(t for t in field["types"] if t not in ("null", "array"))
+        entry["avg_length"] = max(entry["avg_length"], field.get("avg_length", 0.0))
+
+    properties = {}
+    for es_path, entry in sorted(merged.items()):
+        types = entry["types"]
+        parts = es_path.split(".")
+        node = properties
+        for part in parts[:-1]:
+            node = node.setdefault(part, {"properties": {}}).setdefault("properties", {})
+        if "object" in types:
+            if types != {"object"}:
+                print(f"Warning: {es_path} mixes objects and scalars, mapped as object", file=sys.stderr)
+            node.setdefault(parts[-1], {"properties": {}})
+        elif types:
+            node[parts[-1]] = _es_field_type(types, entry["avg_length"])
+    return {"mappings": {"properties": properties}}
+
+
+def print_report(report):
+    """
+    Print the report as a table.
+    """
+    print(f"Documents: {report['documents']}")
+    print(f"{'field':<40} {'present':>8} {'null':>7} {'distinct~':>10}  types")
+    for path, field in report["fields"].items():
+        present = f"{field['present_rate']:.1%}" if "present_rate" in field else "-"
+        types = ", ".join(f"{name}:{count}" for name, count in field["types"].items())
+        print(f"{path:<40} {present:>8} {field['null_rate']:>7.1%} {field['distinct_estimate']:>10}  {types}")
+
+
+def _default_database(client):
+    """
+    Use the URI's default database, or the first user database when it has none.
+    """
+    try:
+        db = client.get_default_database()
+        if db is None:
+            raise ValueError
+    except (ValueError, Exception):
+        names = [n for n in client.list_database_names() if n not in ("admin", "local", "config")]
+        db = client[names[0]]
+    return db.name
+
+
+def main():
+    """
+    Main function to parse arguments and profile the collection.
+    """
+    parser = argparse.ArgumentParser(description="Profile the schema of a MongoDB collection in parallel.")
+    parser.add_argument("--uri", help="MongoDB URI (default: spring.mongodb.uri from Vault)")
+    parser.add_argument("--db", help="Database name (default: the URI's default database)")
+    parser.add_argument("--collection", default=COLLECTION, help="Collection name (default: %(default)s)")
+    parser.add_argument(
+        "--partitions",
+        type=int,
+        default=DEFAULT_PARTITIONS,
+        help="Number of _id ranges scanned in parallel (default: %(default)s)",
+    )
+    parser.add_argument("--fields", help="Comma separated top-level fields to profile (default: all)")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE, help="Cursor batch size (default: %(default)s)")
+    parser.add_argument("--json", metavar="FILE", help="Write the schema report as JSON")
+    parser.add_argument("--es-mapping", metavar="FILE", help="Write an Elasticsearch mapping seeded from the report")
+
+    args = parser.parse_args()
+
+    if args.partitions < 1:
+        parser.error("--partitions must be at least 1")
+
+    # Resolve (and if needed refresh) the URI once here, so the workers never see stale credentials
+    client, uri = connect_mongo(args.uri)
+    try:
+        db_name = args.db or _default_database(client)
+    finally:
+        client.close()
+
+    fields = [f.strip() for f in args.fields.split(",") if f.strip()] if args.fields else None
+
+    print(f"Profiling {db_name}.{args.collection} with {args.partitions} partitions...")
+    start = time.perf_counter()
+    sketch = profile_collection(uri, db_name, args.collection, args.partitions, fields, args.batch_size)
+    elapsed = time.perf_counter() - start
+
+    report = build_report(sketch)
+    print_report(report)
+    print("---")
+    print(f"Elapsed: {elapsed:.2f}s ({report['documents'] / elapsed if elapsed else 0:.0f} docs/sec)")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"Wrote report: {args.json}")
+    if args.es_mapping:
+        with open(args.es_mapping, "w", encoding="utf-8") as f:
+            json.dump(es_mapping(report), f, indent=2)
+        print(f"Wrote mapping: {args.es_mapping}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,185 @@
+"""
+Tests for audio_modifier.py against minimal FLAC files built in tmp_path.
+"""
+
+import json
+import os
+import struct
+import sys
+import threading
+import time
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import audio_modifier  # noqa: E402
+from mutagen.flac import FLAC  # noqa: E402
+
+AUDIO = b"\xff\xf8" + bytes(range(256)) * 20
+
+
+def make_flac(path):
+    """
+    Write a FLAC with only a STREAMINFO block (44.1 kHz, no padding) followed by fake frames.
+    """
+    streaminfo = struct.pack(">HH", 4096, 4096) + bytes(6) + bytes([0x0A, 0xC4, 0x42, 0xF0]) + bytes(20)
+    path.write_bytes(b"fLaC" + bytes([0x80]) + len(streaminfo).to_bytes(3, "big") + streaminfo + AUDIO)
+    return path
+
+
+def make_jpeg(path, width=600, height=400, payload=b""):
+    """
+    Write a JPEG header that is just enough for read_image_info: APP0 then SOF0.
+    """
+    app0 = b"\xff\xe0" + struct.pack(">H", 16) + b"JFIF\0" + bytes(9)
+    sof0 = b"\xff\xc0" + struct.pack(">HBHHB", 17, 8, height, width, 3) + bytes(9)
+    path.write_bytes(b"\xff\xd8" + app0 + sof0 + payload + b"\xff\xd9")
+    return path
+
+
+def test_json_manifest_globs_and_merge_order(tmp_path):
+    album = tmp_path / "album"
+    album.mkdir()
+    for name in ("01.flac", "02.flac"):
+        make_flac(album / name)
+    make_jpeg(album / "cover.jpg")
+    manifest = tmp_path / "library.json"
+    manifest.write_text(
+        json.dumps(
+            [
+                {"path": "album/*.flac", "cover": "album/cover.jpg", "tags": {"album": "A", "artist": "X"}},
+                {"path": "album/01.flac", "tags": {"title": "First", "artist": "Y"}},
+            ]
+        )
+    )
+
+    jobs = audio_modifier.load_manifest(str(manifest))
+
+    first, second = str(album / "01.flac"), str(album / "02.flac")
+    assert sorted(jobs) == [first, second]
+    assert jobs[first] == {"tags": {"album": "A", "artist": "Y", "title": "First"}, "cover": str(album / "cover.jpg")}
+    assert jobs[second] == {"tags": {"album": "A", "artist": "X"}, "cover": str(album / "cover.jpg")}
+
+
+def test_csv_manifest_skips_empty_cells(tmp_path):
+    for name in ("a.flac", "b.flac"):
+        make_flac(tmp_path / name)
+    manifest = tmp_path / "library.csv"
+    manifest.write_text("path,cover,artist,title\n*.flac,,X,\nb.flac,,,Bee\n")
+
+    jobs = audio_modifier.load_manifest(str(manifest))
+
+    assert jobs[str(tmp_path / "a.flac")] == {"tags": {"artist": "X"}, "cover": None}
+    assert jobs[str(tmp_path / "b.flac")] == {"tags": {"artist": "X", "title": "Bee"}, "cover": None}
+
+
+def test_bad_file_does_not_stop_batch(tmp_path):
+    good = [make_flac(tmp_path / f"{i}.flac") for i in range(3)]
+    bad = tmp_path / "bad.flac"
+    bad.write_bytes(b"not a flac")
+    jobs = {str(path): {"tags": {"tracknumber": 1}, "cover": None} for path in [*good, bad]}
+
+    updated, unchanged, failures = audio_modifier.run_batch(jobs, workers=4)
+
+    assert (updated, unchanged) == (3, 0)
+    assert [path for path, _ in failures] == [str(bad)]
+    for path in good:
+        assert FLAC(path)["tracknumber"] == ["1"]
+
+
+def test_cover_cache_builds_once_under_concurrency(tmp_path, monkeypatch):
+    make_jpeg(tmp_path / "cover.jpg")
+    make_jpeg(tmp_path / "same-art.jpg")
+    builds = []
+    build_picture = audio_modifier.build_picture
+
+    def slow_build(data):
+        builds.append(data)
+        time.sleep(0.1)
+        return build_picture(data)
+
+    monkeypatch.setattr(audio_modifier, "build_picture", slow_build)
+    cache = audio_modifier.CoverCache()
+    paths = [tmp_path / "cover.jpg"] * 6 + [tmp_path / "same-art.jpg"] * 2
+    pictures = []
+    threads = [threading.Thread(target=lambda p=p: pictures.append(cache.get(str(p)))) for p in paths]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(builds) == 1
+    assert (cache.misses, cache.hits) == (1, 7)
+    assert all(picture is pictures[0] for picture in pictures)
+    assert (pictures[0].width, pictures[0].height, pictures[0].mime) == (600, 400, "image/jpeg")
+
+
+def test_cover_cache_evicts_least_recently_used(tmp_path):
+    covers = [make_jpeg(tmp_path / f"{i}.jpg", payload=bytes([i]) * 1000) for i in range(3)]
+    size = covers[0].stat().st_size
+    cache = audio_modifier.CoverCache(max_bytes=2 * size)
+
+    cache.get(str(covers[0]))
+    cache.get(str(covers[1]))
+    cache.get(str(covers[0]))  # 1 is now the least recently used
+    cache.get(str(covers[2]))
+    assert cache.misses == 3
+
+    cache.get(str(covers[0]))
+    assert cache.misses == 3
+    cache.get(str(covers[1]))
+    assert cache.misses == 4
+
+
+def test_noop_rerun_does_not_write(tmp_path):
+    flac = make_flac(tmp_path / "track.flac")
+    cover = make_jpeg(tmp_path / "cover.jpg")
+    tags = {"artist": "X", "genre": ["Rock", "Pop"]}
+    assert audio_modifier.tag_file(str(flac), tags, str(cover)) is True
+
+    os.utime(flac, ns=(1_000_000_000, 1_000_000_000))
+    assert audio_modifier.tag_file(str(flac), tags, str(cover)) is False
+    assert flac.stat().st_mtime_ns == 1_000_000_000
+
+
+def test_grown_tag_is_written_in_place(tmp_path):
+    flac = make_flac(tmp_path / "track.flac")
+    cover = make_jpeg(tmp_path / "cover.jpg")
+
+    # The file has no padding, so the first save moves the audio and reserves padding
+    audio_modifier.tag_file(str(flac), {"artist": "X"}, str(cover), padding=64 * 1024)
+    size = flac.stat().st_size
+    assert size > 64 * 1024
+
+    audio_modifier.tag_file(str(flac), {"artist": "X", "comment": "y" * 10_000}, str(cover), padding=64 * 1024)
+
+    assert flac.stat().st_size == size
+    assert flac.read_bytes().endswith(AUDIO)
+    assert FLAC(flac)["comment"] == ["y" * 10_000]
+
+
+def test_read_image_info_rejects_truncated_jpeg(tmp_path):
+    data = make_jpeg(tmp_path / "cover.jpg").read_bytes()
+    # Everything up to the end of the SOF0 frame size fields is needed
+    for length in range(2 + 18 + 10):
+        with pytest.raises(ValueError):
+            audio_modifier.read_image_info(data[:length])
+
+
+def test_stale_picture_dimensions_are_rewritten(tmp_path):
+    flac = make_flac(tmp_path / "track.flac")
+    cover = make_jpeg(tmp_path / "cover.jpg", width=600, height=400)
+
+    # What the old script wrote: the right bytes with a hard-coded 500x500 size
+    old = FLAC(flac)
+    picture = audio_modifier.build_picture(cover.read_bytes())
+    picture.width = picture.height = 500
+    old.add_picture(picture)
+    old.save()
+
+    assert audio_modifier.tag_file(str(flac), {}, str(cover)) is True
+    (stored,) = FLAC(flac).pictures
+    assert (stored.width, stored.height, stored.depth) == (600, 400, 24)
+    assert audio_modifier.tag_file(str(flac), {}, str(cover)) is False
@@ -0,0 +1,312 @@
+"""
+Tests for foojay-api.py against a local stub of the disco API that also serves a fake archive.
+"""
+
+import hashlib
+import http.server
+import importlib.util
+import json
+import os
+import re
+import threading
+import time
+import urllib.parse
+from pathlib import Path
+
+import pytest
+
+SCRIPT = Path(__file__).resolve().parent.parent / "foojay-api.py"
+ARCHIVE = os.urandom(300_000)
+ARCHIVE_SHA256 = hashlib.sha256(ARCHIVE).hexdigest()
+PACKAGES_ETAG = '"packages-v1"'
+PACKAGES_LAST_MODIFIED = "Mon, 19 Oct 2026 00:00:00 GMT"
+
+
+def load_foojay():
+    # The script name has a dash, so it cannot be imported the usual way
+    spec = importlib.util.spec_from_file_location("foojay_api", SCRIPT)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+class StubHandler(http.server.BaseHTTPRequestHandler):
+    """
+    Minimal disco API: /packages, /info and /file (with optional Range support).
+    """
+
+    def do_GET(self):
+        server = self.server
+        server.requests.append((self.path, self.headers.get("Range")))
+        base = f"http://127.0.0.1:{server.server_port}"
+
+        if self.path.startswith("/packages"):
+            self._send_packages(base)
+        elif self.path == "/info":
+            info = {"filename": "jdk.tar.gz", "direct_download_uri": f"{base}/file", "size": len(ARCHIVE)}
+            if server.publish_sha256:
+                info.update(checksum=ARCHIVE_SHA256, checksum_type="sha256")
+            else:
+                info.update(checksum=hashlib.md5(ARCHIVE).hexdigest(), checksum_type="md5")
+            self._send_json({"result": [info]})
+        elif self.path == "/file":
+            self._send_file()
+        else:
+            self.send_error(404)
+
+    def _send_packages(self, base):
+        server = self.server
+        server.validators.append((self.headers.get("If-None-Match"), self.headers.get("If-Modified-Since")))
+        query = urllib.parse.parse_qs(urllib.parse.urlparse(self.path).query)
+        version, operating_system = query["version"][0], query["operating_system"][0]
+        if version == "broken":
+            self.send_error(500)
+            return
+        if self.headers.get("If-None-Match") == PACKAGES_ETAG:
+            self.send_response(304)
+            self.end_headers()
+            return
+        if (version, operating_system) == server.slow_target:
+            time.sleep(0.2)
+
+        link = {"pkg_download_redirect": f"{base}/file", "pkg_info_uri": f"{base}/info"}
+        pkg = {"distribution": "temurin", "java_version": version, "filename": "jdk.tar.gz", "links": link}
+        self._send_json(
+            {"result": [{**pkg, "size": len(ARCHIVE)}]},
+            {"ETag": PACKAGES_ETAG, "Last-Modified": PACKAGES_LAST_MODIFIED},
+        )
+
+    def _send_file(self):
+        match = re.match(r"bytes=(\d+)-(\d*)", self.headers.get("Range") or "")
+        if match and self.server.ranges:
+            start = int(match.group(1))
+            end = int(match.group(2)) if match.group(2) else len(ARCHIVE) - 1
+            if start >= len(ARCHIVE):
+                self.send_response(416)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+            body = ARCHIVE[start : end + 1]
+            self.send_response(206)
+        else:
+            body = ARCHIVE
+            self.send_response(200)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_json(self, data, headers=None):
+        body = json.dumps(data).encode()
+        self.send_response(200)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def foojay(monkeypatch):
+    module = load_foojay()
+    monkeypatch.setattr(module, "CHUNK_SIZE", 4096)
+    monkeypatch.setattr(module, "PARALLEL_MIN_SIZE", 1000)
+    return module
+
+
+def start_server(publish_sha256=True):
+    httpd = http.server.ThreadingHTTPServer(("127.0.0.1", 0), StubHandler)
+    httpd.requests = []
+    httpd.validators = []
+    httpd.ranges = True
+    httpd.publish_sha256 = publish_sha256
+    httpd.slow_target = None
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    return httpd
+
+
+@pytest.fixture(params=[True, False], ids=["sha256", "no-sha256"])
+def server(request):
+    httpd = start_server(request.param)
+    yield httpd
+    httpd.shutdown()
+    httpd.server_close()
+
+
+@pytest.fixture
+def api_server():
+    httpd = start_server()
+    yield httpd
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def base_url(server):
+    return f"http://127.0.0.1:{server.server_port}"
+
+
+def resolve_package(foojay, server):
+    result = foojay.resolve_target(("21", "linux", "x64"), None, base_url(server))
+    assert result["error"] is None
+    return result["packages"][0]
+
+
+def partial_name(foojay, server, pkg):
+    if server.publish_sha256:
+        return ARCHIVE_SHA256
+    return hashlib.sha256(foojay.fetch_package_info(pkg)["url"].encode()).hexdigest()
+
+
+def file_requests(server):
+    return [rng for path, rng in server.requests if path == "/file"]
+
+
+def assert_stored(path, store):
+    assert Path(path).read_bytes() == ARCHIVE
+    assert Path(path).parent.name == ARCHIVE_SHA256
+    assert os.listdir(store / "partial") == []
+
+
+def test_warm_cache_makes_no_requests(foojay, api_server, tmp_path):
+    cache = foojay.ResponseCache(str(tmp_path), ttl=3600)
+
+    first = foojay.resolve_target(("21", "linux", "x64"), cache, base_url(api_server))
+    second = foojay.resolve_target(("21", "linux", "x64"), cache, base_url(api_server))
+
+    assert (first["source"], second["source"]) == ("network", "cache")
+    assert second["packages"] == first["packages"]
+    assert len(api_server.validators) == 1
+
+
+def test_stale_cache_is_revalidated(foojay, api_server, tmp_path):
+    cache = foojay.ResponseCache(str(tmp_path), ttl=0)
+
+    first = foojay.resolve_target(("21", "linux", "x64"), cache, base_url(api_server))
+    second = foojay.resolve_target(("21", "linux", "x64"), cache, base_url(api_server))
+
+    assert (first["source"], second["source"]) == ("network", "revalidated")
+    assert second["packages"] == first["packages"]
+    assert api_server.validators == [(None, None), (PACKAGES_ETAG, PACKAGES_LAST_MODIFIED)]
+
+
+def test_resolve_matrix_keeps_order(foojay, api_server):
+    # The first target answers last, results must still follow the matrix
+    api_server.slow_target = ("17", "linux")
+
+    results = foojay.resolve_matrix(["17", "21"], ["linux", "macos"], ["x64"], None, base_url(api_server))
+
+    targets = [(r["version"], r["operating_system"], r["architecture"]) for r in results]
+    assert targets == [("17", "linux", "x64"), ("17", "macos", "x64"), ("21", "linux", "x64"), ("21", "macos", "x64")]
+    assert [r["packages"][0]["java_version"] for r in results] == ["17", "17", "21", "21"]
+
+
+def test_failing_target_only_sets_its_error(foojay, api_server):
+    results = foojay.resolve_matrix(["17", "broken", "21"], ["linux"], ["x64"], None, base_url(api_server))
+
+    assert [r["error"] is None for r in results] == [True, False, True]
+    assert "500" in results[1]["error"]
+    assert results[1]["packages"] == []
+    assert all(r["packages"] for r in (results[0], results[2]))
+
+
+def test_stream_download(foojay, server, tmp_path):
+    pkg = resolve_package(foojay, server)
+
+    path, digest, source, verified = foojay.download_package(pkg, tmp_path)
+
+    assert (digest, source) == (ARCHIVE_SHA256, "network")
+    assert verified is server.publish_sha256
+    assert_stored(path, tmp_path)
+    assert file_requests(server) == [None]
+
+    # Already in the store: only the checksum lookup can skip the download
+    path_again, _, source_again, _ = foojay.download_package(pkg, tmp_path)
+    assert path_again == path
+    assert source_again == ("store" if server.publish_sha256 else "network")
+
+
+def test_unverified_download_is_flagged(foojay, server, tmp_path, capsys):
+    results = [foojay.resolve_target(("21", "linux", "x64"), None, base_url(server))]
+
+    foojay.download_results(results, str(tmp_path))
+    foojay.print_result(results[0])
+
+    pkg = results[0]["packages"][0]
+    out, err = capsys.readouterr()
+    assert pkg["verified"] is server.publish_sha256
+    assert pkg["sha256"] == ARCHIVE_SHA256
+    if server.publish_sha256:
+        assert "NOT verified" not in out
+        assert err == ""
+    else:
+        assert f"SHA256:   {ARCHIVE_SHA256} (computed locally, NOT verified)" in out
+        assert "download not verified" in err
+
+
+def test_resume_from_prefix(foojay, server, tmp_path):
+    pkg = resolve_package(foojay, server)
+    (tmp_path / "partial").mkdir()
+    (tmp_path / "partial" / (partial_name(foojay, server, pkg) + ".part")).write_bytes(ARCHIVE[:123_457])
+
+    path, digest, _, _ = foojay.download_package(pkg, tmp_path)
+
+    assert digest == ARCHIVE_SHA256
+    assert_stored(path, tmp_path)
+    assert file_requests(server) == ["bytes=123457-"]
+
+
+def test_parallel_ranges(foojay, server, tmp_path):
+    pkg = resolve_package(foojay, server)
+
+    path, digest, _, _ = foojay.download_package(pkg, tmp_path, segments=4)
+
+    assert digest == ARCHIVE_SHA256
+    assert_stored(path, tmp_path)
+    assert len(file_requests(server)) == 4
+    assert all(rng and rng.startswith("bytes=") for rng in file_requests(server))
+
+
+def test_parallel_ranges_without_range_support(foojay, server, tmp_path):
+    server.ranges = False
+    pkg = resolve_package(foojay, server)
+
+    path, digest, _, _ = foojay.download_package(pkg, tmp_path, segments=4)
+
+    assert digest == ARCHIVE_SHA256
+    assert_stored(path, tmp_path)
+
+
+def test_killed_parallel_download_is_not_resumed(foojay, server, tmp_path):
+    # A SIGKILL leaves the pre-sized, mostly zero-filled ranges file behind
+    pkg = resolve_package(foojay, server)
+    (tmp_path / "partial").mkdir()
+    leftover = tmp_path / "partial" / (partial_name(foojay, server, pkg) + ".ranges")
+    leftover.write_bytes(bytes(len(ARCHIVE)))
+
+    path, digest, _, _ = foojay.download_package(pkg, tmp_path)
+
+    assert digest == ARCHIVE_SHA256
+    assert_stored(path, tmp_path)
+    assert file_requests(server) == [None]
+
+
+def test_interrupted_parallel_download_cleans_up(foojay, server, tmp_path, monkeypatch):
+    pkg = resolve_package(foojay, server)
+    write_response = foojay._write_response
+
+    def interrupted(response, f, offset, on_chunk):
+        if offset:
+            raise KeyboardInterrupt
+        return write_response(response, f, offset, on_chunk)
+
+    monkeypatch.setattr(foojay, "_write_response", interrupted)
+    with pytest.raises(KeyboardInterrupt):
+        foojay.download_package(pkg, tmp_path, segments=4)
+    assert os.listdir(tmp_path / "partial") == []
+
+    monkeypatch.setattr(foojay, "_write_response", write_response)
+    path, digest, _, _ = foojay.download_package(pkg, tmp_path, segments=4)
+    assert digest == ARCHIVE_SHA256
+    assert_stored(path, tmp_path)
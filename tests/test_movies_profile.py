@@ -0,0 +1,205 @@
+"""
+Tests for movies_profile.py. The sketch, partition and mapping tests are pure; the scan
+tests need a local mongod (on PATH, or an existing server given by MONGO_TEST_URI).
+"""
+
+import datetime
+import os
+import shutil
+import socket
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+pytest.importorskip("pymongo")
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import movies_profile  # noqa: E402
+from bson import ObjectId  # noqa: E402
+from pymongo import MongoClient  # noqa: E402
+
+TEST_DB = "movies_profile_test"
+
+
+def make_docs(count, start=0):
+    return [
+        {
+            "_id": ObjectId(),
+            "n": i,
+            "title": f"Movie {i}",
+            "plot": None if i % 4 == 0 else "A long enough plot to be mapped as full text, " * 2,
+            "year": 1990 + i % 30,
+            "imdb": {"rating": 5 + i % 5 / 2, "votes": i * 1000},
+            "genres": ["Drama", "Comedy"][: 1 + i % 2],
+            "released": datetime.datetime(2000, 1, 1) + datetime.timedelta(days=i),
+        }
+        for i in range(start, start + count)
+    ]
+
+
+def test_distinct_sketch_is_exact_below_k_and_merges_as_union():
+    left, right = movies_profile.DistinctSketch(k=64), movies_profile.DistinctSketch(k=64)
+    for value in range(40):
+        left.add(value)
+    for value in range(20, 50):
+        right.add(value)
+    # Equal values of different types are different values
+    right.add("1")
+
+    assert left.estimate() == 40
+    left.merge(right)
+    assert left.estimate() == 51
+
+
+def test_distinct_sketch_estimates_above_k():
+    sketch = movies_profile.DistinctSketch(k=1024)
+    for value in range(50_000):
+        sketch.add(value)
+        sketch.add(value)
+
+    assert abs(sketch.estimate() - 50_000) < 50_000 * 0.1
+
+
+def test_schema_sketch_merge_matches_single_pass():
+    docs = make_docs(200)
+    whole, first, second = movies_profile.SchemaSketch(), movies_profile.SchemaSketch(), movies_profile.SchemaSketch()
+    for i, doc in enumerate(docs):
+        whole.add_document(doc)
+        (first if i % 3 else second).add_document(doc)
+
+    first.merge(second)
+
+    assert movies_profile.build_report(first) == movies_profile.build_report(whole)
+    report = movies_profile.build_report(whole)
+    assert report["documents"] == 200
+    assert report["fields"]["plot"]["null_rate"] == 0.25
+    assert report["fields"]["genres[]"]["types"] == {"string": 300}
+    assert report["fields"]["imdb.votes"]["distinct_estimate"] == 200
+    assert "present_rate" not in report["fields"]["genres[]"]
+
+
+def test_partition_queries_cover_ranges_and_other_id_types():
+    assert movies_profile.partition_queries([], None) == [{}]
+
+    low, high = ObjectId(), ObjectId()
+    assert movies_profile.partition_queries([low, high], "objectId") == [
+        {"_id": {"$type": "objectId", "$lt": low}},
+        {"_id": {"$type": "objectId", "$gte": low, "$lt": high}},
+        {"_id": {"$type": "objectId", "$gte": high}},
+        {"_id": {"$not": {"$type": "objectId"}}},
+    ]
+
+
+def test_split_points_refuses_mixed_id_types():
+    class Collection:
+        def __init__(self, ids):
+            self.ids = ids
+
+        def aggregate(self, pipeline):
+            return [{"_id": _id} for _id in self.ids]
+
+    assert movies_profile.split_points(Collection([1, 2, "3", 4]), 2) == ([], None)
+    assert movies_profile.split_points(Collection(list(range(100))), 4) == ([25, 50, 75], "number")
+
+
+def test_es_mapping_from_report():
+    sketch = movies_profile.SchemaSketch()
+    for doc in make_docs(50):
+        sketch.add_document(doc)
+
+    mapping = movies_profile.es_mapping(movies_profile.build_report(sketch))
+
+    assert mapping == {
+        "mappings": {
+            "properties": {
+                "genres": {"type": "keyword"},
+                "imdb": {"properties": {"rating": {"type": "double"}, "votes": {"type": "integer"}}},
+                "n": {"type": "integer"},
+                "plot": {"type": "text", "fields": {"keyword": {"type": "keyword", "ignore_above": 256}}},
+                "released": {"type": "date"},
+                "title": {"type": "keyword"},
+                "year": {"type": "integer"},
+            }
+        }
+    }
+
+
+@pytest.fixture(scope="module")
+def mongo_uri(tmp_path_factory):
+    uri = os.getenv("MONGO_TEST_URI")
+    if uri:
+        yield uri
+        return
+
+    mongod = shutil.which("mongod")
+    if not mongod:
+        pytest.skip("no mongod available (put it on PATH or set MONGO_TEST_URI)")
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        port = s.getsockname()[1]
+    dbpath = tmp_path_factory.mktemp("mongod")
+    process = subprocess.Popen(
+        [mongod, "--dbpath", str(dbpath), "--port", str(port), "--bind_ip", "127.0.0.1"],
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    uri = f"mongodb://127.0.0.1:{port}"
+    client = MongoClient(uri, serverSelectionTimeoutMS=30000)
+    try:
+        client.admin.command("ping")
+    except Exception as e:
+        process.terminate()
+        pytest.skip(f"mongod did not start: {e}")
+    finally:
+        client.close()
+
+    yield uri
+    process.terminate()
+    process.wait(timeout=30)
+
+
+@pytest.fixture
+def movies(mongo_uri):
+    """
+    600 ObjectId documents plus 10 whose _id is a string or an int; every "n" is unique.
+    """
+    client = MongoClient(mongo_uri)
+    collection = client[TEST_DB]["movies"]
+    collection.drop()
+    docs = make_docs(600)
+    docs += [{"_id": f"legacy-{i}", "n": 600 + i} for i in range(5)]
+    docs += [{"_id": 10_000 + i, "n": 605 + i} for i in range(5)]
+    collection.insert_many(docs)
+    yield docs
+    client.drop_database(TEST_DB)
+    client.close()
+
+
+def assert_scanned_once(sketch, docs):
+    # "n" is unique and below the sketch's k, so its distinct count is exact
+    assert sketch.documents == len(docs)
+    assert sketch.fields["n"].count == len(docs)
+    assert sketch.fields["n"].distinct.estimate() == len(docs)
+    assert sketch.fields["_id"].types == {"objectId": 600, "string": 5, "int": 5}
+
+
+def test_partitions_scan_every_document_once(mongo_uri, movies):
+    object_ids = sorted(doc["_id"] for doc in movies if isinstance(doc["_id"], ObjectId))
+    points = [object_ids[i] for i in (150, 300, 450)]
+
+    merged = movies_profile.SchemaSketch()
+    for query in movies_profile.partition_queries(points, "objectId"):
+        merged.merge(movies_profile.scan_partition(mongo_uri, TEST_DB, "movies", query, batch_size=50))
+
+    assert_scanned_once(merged, movies)
+
+
+def test_profile_collection_end_to_end(mongo_uri, movies):
+    sketch = movies_profile.profile_collection(mongo_uri, TEST_DB, "movies", partitions=4, batch_size=50)
+
+    assert_scanned_once(sketch, movies)
+    report = movies_profile.build_report(sketch)
+    assert report["fields"]["title"]["present_rate"] == round(600 / 610, 4)
@@ -0,0 +1,169 @@
+"""
+Shared Vault KV v2 secret lookup with a local, permission-restricted cache.
+
+Secrets are cached per (Vault address, mount, path, version) in a 0600 file inside a
+0700 directory; an existing cache directory that others can access is refused, never
+re-permissioned. A secret read as "latest" expires after its lease_duration when Vault
+returns one, capped at VAULT_CACHE_TTL seconds. It is also stored under its version
+number, because a pinned version never changes and is kept until invalidated.
+hvac is only imported, and VAULT_TOKEN only required, when the cache misses.
+
+Usage from other tools:
+    from vault_secrets import connect_mongo
+    client, mongo_uri = connect_mongo()
+"""
+
+import hashlib
+import json
+import os
+import tempfile
+import time
+
+VAULT_ADDR = os.getenv("VAULT_ADDR", "https://vault.sundalei.tech")
+KV_MOUNT = "secret"
+MONGO_SECRET_PATH = "mongo-es-demo"
+MONGO_KEY = "spring.mongodb.uri"
+
+CACHE_DIR = os.getenv(
+    "VAULT_CACHE_DIR",
+    os.path.join(os.getenv("XDG_CACHE_HOME", os.path.expanduser("~/.cache")), "vault-secrets"),
+)
+CACHE_TTL = int(os.getenv("VAULT_CACHE_TTL", 60 * 60))
+
+
+def _cache_path(path, mount, version):
+    key = f"{VAULT_ADDR}|{mount}|{path}|{version or 'latest'}"
+    return os.path.join(CACHE_DIR, hashlib.sha256(key.encode()).hexdigest() + ".json")
+
+
+def _is_private(st):
+    """
+    True when a stat result belongs to us and grants nothing to group or others.
+    """
+    return os.name != "posix" or (st.st_uid == os.getuid() and not st.st_mode & 0o077)
+
+
+def _load_cached(cache_file, version):
+    """
+    Return the cached entry if it is private to us and still valid, else None.
+    """
+    try:
+        # Refuse a cache anyone else could have read, written or swapped out
+        if not _is_private(os.stat(CACHE_DIR)) or not _is_private(os.stat(cache_file)):
+            return None
+        with open(cache_file, "r", encoding="utf-8") as f:
+            entry = json.load(f)
+    except (OSError, ValueError):
+        return None
+
+    if version is not None:
+        return entry if entry.get("version") == version else None
+    if time.time() >= entry.get("expires_at", 0):
+        return None
+    return entry
+
+
+def _store_cached(cache_file, entry):
+    """
+    Write the entry atomically with owner-only permissions.
+    """
+    try:
+        os.mkdir(CACHE_DIR, mode=0o700)
+    except FileExistsError:
+        if not _is_private(os.stat(CACHE_DIR)):
+            raise PermissionError(f"refusing to cache secrets in {CACHE_DIR}: it is accessible by other users")
+    except FileNotFoundError:
+        os.makedirs(CACHE_DIR, mode=0o700)
+
+    fd, tmp_path = tempfile.mkstemp(dir=CACHE_DIR, suffix=".tmp")  # mkstemp creates the file as 0600
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(entry, f)
+        os.replace(tmp_path, cache_file)
+    except OSError:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def _read_from_vault(path, mount, version):
+    """
+    Read a KV v2 secret from Vault. Returns (data, version, lease_duration).
+    """
+    import hvac
+
+    vault = hvac.Client(url=VAULT_ADDR, token=os.environ["VAULT_TOKEN"])
+    assert vault.is_authenticated(), "Vault auth failed - check VAULT_TOKEN"
+
+    secret = vault.secrets.kv.v2.read_secret_version(path=path, mount_point=mount, version=version)
+    return secret["data"]["data"], secret["data"]["metadata"]["version"], secret.get("lease_duration") or 0
+
+
+def read_secret(path, key=None, mount=KV_MOUNT, version=None, refresh=False):
+    """
+    Return the secret data at path (or one key of it), from the local cache when possible.
+    Pass refresh=True to skip the cache, e.g. after the cached value turned out to be stale.
+    """
+    cache_file = _cache_path(path, mount, version)
+    entry = None if refresh else _load_cached(cache_file, version)
+
+    if entry is None:
+        data, secret_version, lease_duration = _read_from_vault(path, mount, version)
+        fetched_at = time.time()
+        ttl = min(lease_duration, CACHE_TTL) if lease_duration > 0 else CACHE_TTL
+        entry = {"fetched_at": fetched_at, "expires_at": fetched_at + ttl, "version": secret_version, "data": data}
+        try:
+            _store_cached(cache_file, entry)
+            if version is None:
+                # The same data is what a read pinned to this version will return
+                _store_cached(_cache_path(path, mount, secret_version), entry)
+        except OSError as e:
+            print(f"Warning: could not cache Vault secret {mount}/{path}: {e}")
+
+    return entry["data"] if key is None else entry["data"][key]
+
+
+def invalidate(path, mount=KV_MOUNT, version=None):
+    """
+    Drop a cached secret so the next read goes to Vault.
+    """
+    try:
+        os.remove(_cache_path(path, mount, version))
+    except FileNotFoundError:
+        pass
+
+
+def get_mongo_uri(refresh=False):
+    """
+    Return the Mongo URI shared by the Mongo tools.
+    """
+    return read_secret(MONGO_SECRET_PATH, MONGO_KEY, refresh=refresh)
+
+
+def connect_mongo(uri=None, **client_kwargs):
+    """
+    Return (client, uri) for a MongoClient that answered a ping.
+
+    Without an explicit uri the shared Mongo URI is used. If the cached URI is rejected
+    (e.g. its credentials were rotated), it is fetched again from Vault once and the
+    cache updated, so the returned uri is safe to hand to worker processes.
+    """
+    from pymongo import MongoClient
+    from pymongo.errors import OperationFailure
+
+    client_kwargs.setdefault("serverSelectionTimeoutMS", 50000)
+    from_vault = uri is None
+    if from_vault:
+        uri = get_mongo_uri()
+
+    client = MongoClient(uri, **client_kwargs)
+    try:
+        client.admin.command("ping")
+    except OperationFailure:
+        client.close()
+        if not from_vault:
+            raise
+        uri = get_mongo_uri(refresh=True)
+        client = MongoClient(uri, **client_kwargs)
+        client.admin.command("ping")
+    return client, uri